@@ -115,8 +115,8 @@ ENCRYPTED_DIR_EXT     = "#D#CRYPT"
 ENCRYPTED_FILE_EXT    = "#F#CRYPT"
 CONFLICT_DIR_EXT      = ENCRYPTED_DIR_EXT + CONFLICT_EXT
 CONFLICT_FILE_EXT     = ENCRYPTED_FILE_EXT + CONFLICT_EXT
-ENCRYPTED_DIR_FORMAT  = "{name}#{md5}#{ts}" + ENCRYPTED_DIR_EXT
-ENCRYPTED_FILE_FORMAT = "{name}#{md5}#{ts}" + ENCRYPTED_FILE_EXT
+ENCRYPTED_DIR_FORMAT  = "{name}#{hash}#{ts}" + ENCRYPTED_DIR_EXT
+ENCRYPTED_FILE_FORMAT = "{name}#{hash}#{ts}" + ENCRYPTED_FILE_EXT
 
 # format used in encrypted filenames
 TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
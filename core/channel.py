@@ -1,14 +1,19 @@
+import os
+import stat
+import time
 import logging
+import subprocess
 from pathlib import Path
 import shutil
 import hashlib
 import base64
 import tarfile
 import tempfile
-from itertools import groupby
+from itertools import groupby, chain
 import datetime
 import re
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
 from core.exceptions import MicrodotError, MDConflictError, MDLinkError, MDEncryptionError
 from core.exceptions import MDDotNotFoundError, MDChannelNotFoundError, MDPathNotFoundError
@@ -17,14 +22,54 @@ from core import state
 from core import CONFLICT_EXT, ENCRYPTED_DIR_EXT, ENCRYPTED_FILE_EXT, ENCRYPTED_DIR_FORMAT, ENCRYPTED_FILE_FORMAT
 from core import CONFLICT_FILE_EXT, CONFLICT_DIR_EXT, TIMESTAMP_FORMAT, DECRYPTED_DIR, SCAN_CHANNEL_BLACKLIST, SCAN_DIR_BLACKLIST
 from core import SCAN_DIR_FILE
-from core.utils import confirm, colorize, debug, info, get_hash, get_tar
+from core.utils import confirm, colorize, debug, info, get_hash, get_tar_stream
+from core.utils import lz4, lz4_decompress_chunks, LZ4_MAGIC
 from core.tree import TreeNode
 
-from cryptography.fernet import Fernet
-import cryptography
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, hmac, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 logger = logging.getLogger("microdot")
 
+# first byte of a fernet token, used to recognize raw (non base64) tokens
+FERNET_VERSION = b'\x80'
+
+# block size used when streaming files through encrypt/decrypt
+CHUNK_SIZE = 1 << 20
+
+def parse_timestamp(ts):
+    """ Specialized parser for TIMESTAMP_FORMAT (%Y%m%d%H%M%S), an order of
+        magnitude faster than strptime and the format never changes """
+    return datetime.datetime(int(ts[0:4]), int(ts[4:6]), int(ts[6:8]),
+                             int(ts[8:10]), int(ts[10:12]), int(ts[12:14]))
+
+# parse encrypted filenames: name#hash#timestamp#D|F#CRYPT[#CONFLICT]
+ENCRYPTED_NAME_RE = re.compile(r'^(?P<name>[^#]+)#(?P<hash>[^#]+)#(?P<ts>[0-9]{14})#[DF]#CRYPT$')
+CONFLICT_NAME_RE  = re.compile(r'^(?P<name>[^#]+)#(?P<hash>[^#]+)#(?P<ts>[0-9]{14})#[DF]#CRYPT#CONFLICT$')
+
+
+class ChunkReader():
+    """ Minimal read-only file object over an iterator of byte chunks.
+        Used to feed decrypted data straight into tarfile """
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = b''
+
+    def read(self, n=-1):
+        if n < 0:
+            data = b''.join([self._buf, *self._chunks])
+            self._buf = b''
+            return data
+        while len(self._buf) < n:
+            try:
+                self._buf += next(self._chunks)
+            except StopIteration:
+                break
+        data = self._buf[:n]
+        self._buf = self._buf[n:]
+        return data
+
 
 @dataclass
 class Conflict():
@@ -55,6 +100,10 @@ class Conflict():
 class DotBaseClass():
     """ Represents an unencrypted dotfile/dir.
         Is also the baseclass for DotEncryptedBaseClass """
+
+    # channels hold hundreds of these, skip the per-instance dict
+    __slots__ = ('channel', 'path', 'name', 'link_path', 'is_encrypted')
+
     def __init__(self, path, channel):
         """ path is where dotfile source is: /home/eco/.dotfiles/common/testfile.txt """
 
@@ -63,30 +112,39 @@ class DotBaseClass():
         self.name = path.relative_to(channel)
         self.link_path = Path.home() / self.name
         self.is_encrypted = False
-        self.cleanup_link()
 
         if not self.path.parent.is_dir():
             debug("__init__", 'mkdir', self.path.parent)
             self.path.parent.mkdir(parents=True)
 
     def cleanup_link(self):
-        # find orphan links (symlink that points 
-        if self.link_path.is_symlink():
+        # find orphan links (symlink that points
+        # a single lstat tells us if there is a symlink at all, this runs
+        # for every dotfile on every channel construction
+        try:
+            st = os.lstat(self.link_path)
+        except OSError:
+            return
+
+        if stat.S_ISLNK(st.st_mode):
             if not self.path.exists():
                 self.link_path.unlink()
                 info("cleanup_link", "remove", f"orphan link found: {self.link_path}")
             #elif not self.link_path.resolve() == self.path:
             #    info("cleanup_link", "remove", f"link doesn't point to data: {self.link_path}")
             #    self.link_path.unlink()
-            elif not self.link_path.resolve().exists():
+            elif not os.path.exists(self.link_path):
+                # exists() follows the link, no need to resolve() the whole chain
                 info("cleanup_link", "remove", f"link doesn't point to existing data: {self.link_path}")
                 self.link_path.unlink()
 
     def check_symlink(self):
-        # check if link links to src
-        if not self.link_path.is_symlink():
+        # check if link links to src, readlink is a single syscall where
+        # resolve() walks the whole chain
+        try:
+            return os.readlink(self.link_path) == str(self.path.absolute())
+        except OSError:
             return
-        return self.link_path.resolve() == self.path.absolute()
 
     def is_dir(self):
         return self.path.is_dir()
@@ -95,6 +153,8 @@ class DotBaseClass():
         return self.path.is_file()
 
     def link(self, target=None, force=False):
+        self.cleanup_link()
+
         if self.check_symlink():
             raise MDLinkError(f"Dotfile is already linked: {self.name}")
 
@@ -110,24 +170,26 @@ class DotBaseClass():
         if not target:
             target = self.path
 
-        if link.is_symlink():
-            link.unlink()
+        # plain os calls, pathlib dispatch adds up when linking a whole channel
+        link_str = str(link)
+
+        if os.path.islink(link_str):
+            os.unlink(link_str)
 
-        if link.exists() and force:
+        if os.path.exists(link_str) and force:
             self.remove_path(link)
             info("link", "removed", "Path exists, using --force to overwrite: {link}")
 
-        if link.is_symlink():
-            raise MDLinkError(f"Dotfile already linked: {link}")
-
-        if link.exists():
+        if os.path.lexists(link_str):
             raise MDLinkError(f"Path exists at link location: {link}")
 
-        link.symlink_to(target)
+        os.symlink(target, link_str)
         debug("link", 'linked', f'{link} -> {target.name}')
         return True
     
     def unlink(self):
+        self.cleanup_link()
+
         if not self.check_symlink():
             raise MDLinkError(f"Dotfile is not linked: {self.name}")
 
@@ -178,19 +240,26 @@ class DotBaseClass():
 
 class DotEncryptedBaseClass(DotBaseClass):
     """ Baseclass for all encrypted files/directories """
+
+    __slots__ = ('hash', 'encrypted_path', 'timestamp', '_key', '_sig_key', '_enc_key')
+
     def __init__(self, path, channel, key):
-        try: # parse CRYPT file: ~/.dotfiles/common/testdir#IzjOuV4h#20220121162145#D#CRYPT
-            name, self.hash, ts,  _, _ = path.name.split('#')
-            self.path = channel.parent / DECRYPTED_DIR / channel.name / path.relative_to(channel).parent / name
+        # pathlib '/' joins are not free, build the decrypted base dir once
+        decrypted_base = channel.parent / DECRYPTED_DIR / channel.name
+
+        # parse CRYPT file: ~/.dotfiles/common/testdir#IzjOuV4h#20220121162145#D#CRYPT
+        # a single regex match replaces the split('#') try/except ladder
+        if (m := ENCRYPTED_NAME_RE.match(path.name)):
+            self.hash = m['hash']
+            self.path = decrypted_base / path.relative_to(channel).parent / m['name']
             self.encrypted_path = path
-            self.name = self.path.relative_to(channel.parent / DECRYPTED_DIR / channel.name)
-            self.timestamp = datetime.datetime.strptime(ts, TIMESTAMP_FORMAT)
-            self.link_path = Path.home() / self.name
-        except ValueError:
+            self.name = self.path.relative_to(decrypted_base)
+            self.timestamp = parse_timestamp(m['ts'])
+        else:
             try: # parse path that will be used by init to initiate new encrypted dotfile: ~/.dotfiles/common/testfile.txt
                  # allow incomplete data. missing data will be added later
                 self.hash = None
-                self.path = channel.parent / DECRYPTED_DIR / channel.name / path.relative_to(channel)
+                self.path = decrypted_base / path.relative_to(channel)
                 self.name = path.relative_to(channel)
                 try:
                     self.encrypted_path = self.get_encrypted_path(channel, self.name)
@@ -205,10 +274,7 @@ class DotEncryptedBaseClass(DotBaseClass):
         self.channel = channel
         self.link_path = Path.home() / self.name
         self.is_encrypted = True
-        self._key = key
-
-        # cleanup orphan links (symlink that point to non existing data
-        self.cleanup_link()
+        self._split_key(key)
 
         # ensure decrypted dir exists
         if not self.path.parent.is_dir():
@@ -224,14 +290,8 @@ class DotEncryptedBaseClass(DotBaseClass):
         """ Find conflicts that belong to this dotfile/dir """
         conflicts = []
         for p in self.encrypted_path.parent.iterdir():
-            if not p.name.endswith(CONFLICT_EXT):
-                continue
-            try:
-                name, _, _,  _, _, _ = p.name.split('#')
-                if name == self.name.name:
-                    conflicts.append(Conflict(p, p.relative_to(self.channel)))
-            except ValueError:
-                pass
+            if (m := CONFLICT_NAME_RE.match(p.name)) and m['name'] == self.name.name:
+                conflicts.append(Conflict(p, p.relative_to(self.channel)))
         return conflicts
 
     def get_conflict(self, path):
@@ -242,33 +302,117 @@ class DotEncryptedBaseClass(DotBaseClass):
     def decrypt_conflict(self, conflict, dest):
         self.decrypt(src=conflict.path, dest=dest)
 
+    def _split_key(self, key):
+        """ Decode and split the fernet key once so encrypt/decrypt don't
+            have to re-derive it on every call """
+        self._key = key
+        raw = base64.urlsafe_b64decode(key)
+        self._sig_key = raw[:16]
+        self._enc_key = raw[16:]
+
+    def _encrypt_stream(self, fsrc, fdst):
+        """ Stream fsrc into fdst as a raw fernet token, in chunks so memory
+            use stays flat no matter how big the payload is """
+        iv = os.urandom(16)
+        ts = int(time.time()).to_bytes(8, 'big')
+
+        padder = padding.PKCS7(128).padder()
+        encryptor = Cipher(algorithms.AES(self._enc_key), modes.CBC(iv)).encryptor()
+        h = hmac.HMAC(self._sig_key, hashes.SHA256())
+
+        head = FERNET_VERSION + ts + iv
+        h.update(head)
+        fdst.write(head)
+
+        while (chunk := fsrc.read(CHUNK_SIZE)):
+            block = encryptor.update(padder.update(chunk))
+            h.update(block)
+            fdst.write(block)
+
+        block = encryptor.update(padder.finalize()) + encryptor.finalize()
+        h.update(block)
+        fdst.write(block)
+        fdst.write(h.finalize())
+
+    def _iter_decrypted(self, fsrc):
+        """ Yield plaintext chunks from a raw token in fsrc. The hmac is
+            verified in a first pass so no plaintext is produced before the
+            token is authenticated """
+        fsrc.seek(0, 2)
+        size = fsrc.tell()
+        if size < 57:
+            raise InvalidSignature("Not a valid token")
+
+        h = hmac.HMAC(self._sig_key, hashes.SHA256())
+        fsrc.seek(0)
+        remaining = size - 32
+        while remaining > 0:
+            chunk = fsrc.read(min(CHUNK_SIZE, remaining))
+            h.update(chunk)
+            remaining -= len(chunk)
+        h.verify(fsrc.read(32))
+
+        fsrc.seek(9)
+        iv = fsrc.read(16)
+        decryptor = Cipher(algorithms.AES(self._enc_key), modes.CBC(iv)).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        remaining = size - 57
+        while remaining > 0:
+            chunk = fsrc.read(min(CHUNK_SIZE, remaining))
+            yield unpadder.update(decryptor.update(chunk))
+            remaining -= len(chunk)
+        yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
+
+    def _decrypt_stream(self, fsrc, fdst):
+        for chunk in self._iter_decrypted(fsrc):
+            fdst.write(chunk)
+
+    def _decrypt_bytes(self, token):
+        """ Verify and decrypt a legacy base64 encoded fernet token """
+        token = base64.urlsafe_b64decode(token)
+
+        if not token.startswith(FERNET_VERSION) or len(token) < 57:
+            raise InvalidSignature("Not a valid token")
+
+        h = hmac.HMAC(self._sig_key, hashes.SHA256())
+        h.update(token[:-32])
+        h.verify(token[-32:])
+
+        iv = token[9:25]
+        decryptor = Cipher(algorithms.AES(self._enc_key), modes.CBC(iv)).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        padded = decryptor.update(token[25:-32]) + decryptor.finalize()
+        return unpadder.update(padded) + unpadder.finalize()
+
     def encrypt(self, src, key=None, force=False):
         """ Do some encryption here and write to self.encrypted_path """
         # TODO encrypt should decide on encrypted_path here because it depends on the given src
 
-        if key == None:
-            key = self._key
+        if key != None and key != self._key:
+            self._split_key(key)
 
         self.encrypted_path = self.get_encrypted_path(self.channel, self.name, src=src)
 
-        # if dir, compress dir into tmp tar file
-        if src.is_dir():
-            src = get_tar(src)
-
         if self.encrypted_path.exists():
             if force:
                 self.remove_path(self.encrypted_path)
             else:
                 raise MDPathExistsError(f"Encrypted file exists in channel: {self.encrypted_path}")
 
-        fernet = Fernet(key)
-        encrypted = fernet.encrypt(src.read_bytes())
-
-        # cleanyp tmp file
-        if src.is_dir():
-            src.unlink()
+        # write to a tmp name and rename on success so a failed stream never
+        # leaves a half written archive at the final path
+        tmp_path = self.encrypted_path.with_name(self.encrypted_path.name + '.tmp')
 
-        self.encrypted_path.write_bytes(encrypted)
+        try:
+            # if dir, pipe a tar stream of the dir into the encryptor
+            opener = get_tar_stream(src) if src.is_dir() else open(src, 'rb')
+            with opener as fsrc, open(tmp_path, 'wb') as fdst:
+                self._encrypt_stream(fsrc, fdst)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        os.replace(tmp_path, self.encrypted_path)
         debug("encrypt", 'encrypted', f'{src.name} -> {self.encrypted_path}')
 
     def decrypt(self, dest=None, src=None):
@@ -283,16 +427,28 @@ class DotEncryptedBaseClass(DotBaseClass):
             dest.unlink()
 
         try:
-            fernet = Fernet(self._key)
-            decrypted = fernet.decrypt(src.read_bytes())
-        except cryptography.fernet.InvalidToken:
+            with open(src, 'rb') as fsrc:
+                if fsrc.read(1) == FERNET_VERSION:
+                    fsrc.seek(0)
+                    with open(dest, 'wb') as fdst:
+                        self._decrypt_stream(fsrc, fdst)
+                else:
+                    # tokens written by older versions are base64 encoded
+                    # and have to be decrypted in one piece
+                    fsrc.seek(0)
+                    dest.write_bytes(self._decrypt_bytes(fsrc.read()))
+        except (InvalidSignature, ValueError):
             # TODO needs unittest
+            if dest.exists():
+                dest.unlink()
             raise MDEncryptionError(f"Failed to decrypt {src}, invalid key.")
 
-        dest.write_bytes(decrypted)
         debug("decrypt", 'decrypted', f'{src.name} -> {dest}')
 
     def link(self, force=False):
+        # cleanup a stale link before decrypt() recreates the data it points
+        # to, otherwise the orphan link counts as already linked
+        self.cleanup_link()
         self.decrypt()
         DotBaseClass.link(self, force=force)
 
@@ -305,31 +461,35 @@ class DotEncryptedBaseClass(DotBaseClass):
             return
         info("update", 'changed', self.path)
 
+        # the decrypted data is the source we just encrypt from, there is no
+        # need to unlink/relink and decrypt the whole thing again afterwards
         old_encrypted_path = self.encrypted_path
         self.encrypt(self.path, self._key, force=True)
-        self.unlink()
-        old_encrypted_path.unlink()
-        self.link()
+
+        # encrypt() lands on the identical path when hash and timestamp are
+        # unchanged, don't delete the archive we just wrote
+        if old_encrypted_path != self.encrypted_path:
+            old_encrypted_path.unlink()
 
         info("update", 'updated', f'{self.name} -> {self.encrypted_path.name}')
 
     def is_changed(self):
         """ Indicate if decrypted dir has changed from encrypted file
-            Checks current file md5 against last md5 """
+            Checks current file hash against last hash """
         return not self.check_symlink() or self.hash != get_hash(self.path)
 
     def get_encrypted_path(self, channel, name, src=None):
         """ If src is specified, calculate hash from this source instead of standard decrypted data location """
         if src == None:
-            md5 = get_hash(Path.home() / name)
+            hash = get_hash(Path.home() / name)
         else:
-            md5 = get_hash(src)
+            hash = get_hash(src)
 
         ts = datetime.datetime.utcnow().strftime(TIMESTAMP_FORMAT)
         if self.is_dir():
-            return channel / ENCRYPTED_DIR_FORMAT.format(name=name, ts=ts, md5=md5)
+            return channel / ENCRYPTED_DIR_FORMAT.format(name=name, ts=ts, hash=hash)
         else:
-            return channel / ENCRYPTED_FILE_FORMAT.format(name=name, ts=ts, md5=md5)
+            return channel / ENCRYPTED_FILE_FORMAT.format(name=name, ts=ts, hash=hash)
 
     def unlink(self):
         if not DotBaseClass.unlink(self):
@@ -365,6 +525,9 @@ class DotEncryptedBaseClass(DotBaseClass):
 
 class DotFileEncrypted(DotEncryptedBaseClass):
     """ Represents encrypted file """
+
+    __slots__ = ()
+
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -377,6 +540,9 @@ class DotFileEncrypted(DotEncryptedBaseClass):
 
 class DotDirEncrypted(DotEncryptedBaseClass):
     """ Represents encrypted dir """
+
+    __slots__ = ()
+
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -390,22 +556,61 @@ class DotDirEncrypted(DotEncryptedBaseClass):
         if dest == None:
             dest = self.path
 
-        tmp_dir = Path(tempfile.mkdtemp())
-        tmp_file = Path(tempfile.mktemp())
-
-        DotEncryptedBaseClass.decrypt(self, src=src, dest=tmp_file)
-
-        with tarfile.open(tmp_file, 'r') as tar:
-            tar.extractall(tmp_dir)
-
-        if dest.exists():
-            shutil.rmtree(dest, ignore_errors=False, onerror=None)
+        if src == None:
+            src = self.encrypted_path
 
-        # cant use pathlib's replace because files need to be on same filesystem
-        shutil.move((tmp_dir / self.name.name), dest)
-        debug("decrypt", "moved", f"{tmp_dir/self.name.name} -> {dest}")
+        # keep the tmp dir on the same filesystem as dest, /tmp is often a
+        # separate tmpfs which would turn the final rename into a full copy
+        tmp_dir = Path(tempfile.mkdtemp(dir=dest.parent))
 
-        tmp_file.unlink()
+        try:
+            # pipe decrypted chunks straight into the tar extraction instead
+            # of writing the decrypted archive to a tmp file first
+            with open(src, 'rb') as fsrc:
+                if fsrc.read(1) == FERNET_VERSION:
+                    fsrc.seek(0)
+                    chunks = self._iter_decrypted(fsrc)
+                else:
+                    fsrc.seek(0)
+                    chunks = iter([self._decrypt_bytes(fsrc.read())])
+
+                # peek at the first chunk to see if the archive is lz4
+                # compressed, uncompressed legacy archives pass through
+                first = next(chunks, b'')
+                chunks = chain([first], chunks)
+                if first.startswith(LZ4_MAGIC):
+                    if lz4 == None:
+                        raise MDEncryptionError(f"Archive is lz4 compressed but lz4 is not installed: {src}")
+                    chunks = lz4_decompress_chunks(chunks)
+
+                if shutil.which('tar'):
+                    # native tar extracts a lot faster than the pure python
+                    # tarfile module, feed it over stdin
+                    p = subprocess.Popen(['tar', '-xf', '-', '-C', str(tmp_dir)],
+                                         stdin=subprocess.PIPE)
+                    try:
+                        for chunk in chunks:
+                            p.stdin.write(chunk)
+                    finally:
+                        p.stdin.close()
+                    if p.wait() != 0:
+                        raise MDEncryptionError(f"Failed to extract archive: {src}")
+                else:
+                    with tarfile.open(fileobj=ChunkReader(chunks), mode='r|') as tar:
+                        tar.extractall(tmp_dir)
+
+            if dest.exists():
+                shutil.rmtree(dest, ignore_errors=False, onerror=None)
+
+            # atomic rename, O(1) regardless of dir size
+            os.replace(tmp_dir / self.name.name, dest)
+            debug("decrypt", "moved", f"{tmp_dir/self.name.name} -> {dest}")
+        except (InvalidSignature, ValueError):
+            # TODO needs unittest
+            raise MDEncryptionError(f"Failed to decrypt {src}, invalid key.")
+        finally:
+            # the tmp dir lives next to dest now, don't leak it on failure
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 class Channel():
@@ -414,9 +619,17 @@ class Channel():
         self._key = state.encryption.key
         self._path = path
         self.name = path.name
-        self.dotfiles = self.search_dotfiles()
+        self._dotfiles = None
         self._colors = state.colors
 
+    @property
+    def dotfiles(self):
+        """ Search dotfiles on first access, commands that don't touch the
+            dotfile list then skip the channel dir walk entirely """
+        if self._dotfiles == None:
+            self._dotfiles = self.search_dotfiles()
+        return self._dotfiles
+
     def format_df(self, prefix, name, color):
         return prefix +  colorize(name, color)
 
@@ -440,10 +653,15 @@ class Channel():
     def list(self, display=True):
         root = TreeNode(colorize(f"channel: {self.name}", state.colors.channel_name))
 
-        dotfiles  =  [d for d in self.dotfiles if d.is_dir() and not d.is_encrypted]
-        dotfiles += [f for f in self.dotfiles if f.is_file() and not f.is_encrypted]
-        dotfiles += [d for d in self.dotfiles if d.is_dir() and d.is_encrypted]
-        dotfiles += [f for f in self.dotfiles if f.is_file() and f.is_encrypted]
+        # partition in a single pass instead of four scans over the list
+        raw_dirs, raw_files, enc_dirs, enc_files = [], [], [], []
+        for df in self.dotfiles:
+            if df.is_dir():
+                (enc_dirs if df.is_encrypted else raw_dirs).append(df)
+            elif df.is_file():
+                (enc_files if df.is_encrypted else raw_files).append(df)
+
+        dotfiles = raw_dirs + raw_files + enc_dirs + enc_files
 
         for df in dotfiles:
             self.add_tree_nodes(df, root)
@@ -456,9 +674,15 @@ class Channel():
 
         return root
 
+    def verify_links(self):
+        """ Cleanup orphan symlinks, deferred out of the dotfile constructors
+            so read only commands like --list don't pay for it """
+        for df in self.dotfiles:
+            df.cleanup_link()
+
     def link_all(self, force=False):
         """ Link all dotfiles in channel """
-        dotfiles = [df for df in self.dotfiles if not df.check_symlink()]
+        self.verify_links()
         if not (dotfiles := [df for df in self.dotfiles if not df.check_symlink()]):
             info("link_all", "link_all", "Nothing to link")
             return
@@ -469,6 +693,7 @@ class Channel():
 
     def unlink_all(self):
         """ Unlink all dotfiles in channel """
+        self.verify_links()
         if not (dotfiles := [df for df in self.dotfiles if df.check_symlink()]):
             info("unlink_all", "unlink_all", "Nothing to unlink")
             return
@@ -505,6 +730,9 @@ class Channel():
             else:
                 raise MDPathNotFoundError(f"Path is not a file or directory: {path}")
 
+        # cleanup a stale symlink at the link location before checking src
+        dotfile.cleanup_link()
+
         # raise error if dotfile already exists
         if self.dotfile_exists(dotfile.name):
             raise MDConflictError(f"Dotfile already managed: {dotfile.name}")
@@ -545,13 +773,17 @@ class Channel():
         """
         paths = []
 
-        for p in path.iterdir():
-            if (p / SCAN_DIR_FILE).is_file():
-                paths.append(p)
-            elif p.is_dir():
-                paths += self.scan_dir(p)
-            else:
-                paths.append(p)
+        # scandir caches the file type from the dir entry so is_dir()
+        # doesn't cost an extra stat call per path
+        with os.scandir(path) as entries:
+            for entry in entries:
+                p = Path(entry.path)
+                if not entry.is_dir():
+                    paths.append(p)
+                elif (p / SCAN_DIR_FILE).is_file():
+                    paths.append(p)
+                else:
+                    paths += self.scan_dir(p)
         return paths
 
     def search_dotfiles(self) -> list:
@@ -602,7 +834,18 @@ def get_channels(state):
     """ Find all channels in dotfiles dir and create Channel objects """
     path      = state.core.dotfiles_dir
     blacklist = state.core.channel_blacklist + SCAN_CHANNEL_BLACKLIST
-    return [ Channel(d, state) for d in Path(path).iterdir() if d.is_dir() and d.name not in blacklist ]
+    dirs      = [ d for d in Path(path).iterdir() if d.is_dir() and d.name not in blacklist ]
+
+    # a bare Channel() does no I/O since the dotfile list went lazy, so
+    # materialize the list inside the pool to make the syscall bound dir
+    # scans actually overlap
+    def build(path):
+        channel = Channel(path, state)
+        channel.dotfiles
+        return channel
+
+    with ThreadPoolExecutor(max_workers=min(8, len(dirs) or 1)) as ex:
+        return list(ex.map(build, dirs))
 
 def get_channel(name, state, create=False, assume_yes=False):
     """ Find or create and return Channel object """
@@ -610,6 +853,11 @@ def get_channel(name, state, create=False, assume_yes=False):
     dotfiles_dir = state.core.dotfiles_dir
     path         = dotfiles_dir / name
 
+    # dirs like DECRYPTED_DIR live inside the dotfiles dir but are not
+    # channels, the old full scan filtered these out
+    if name in state.core.channel_blacklist + SCAN_CHANNEL_BLACKLIST:
+        raise MDChannelNotFoundError(f"Channel {name} not found")
+
     if not path.is_dir():
         if not create:
             raise MDChannelNotFoundError(f"Channel {name} not found")
@@ -622,9 +870,9 @@ def get_channel(name, state, create=False, assume_yes=False):
         except PermissionError as e:
             raise MDPermissionError("Insufficient permissions to create channel: {name}")
 
-    for channel in get_channels(state):
-        if channel.name == name:
-            return channel
+    # construct only the requested channel, scanning all channels here
+    # would walk every dotfile in every channel dir
+    return Channel(path, state)
 
 # TODO below should be part of channel class??
 def get_encrypted_dotfiles(linked=False, grouped=False):
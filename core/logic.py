@@ -61,6 +61,9 @@ class SyncAlgorithm(LastSyncIndex):
         """ Check if items from list don't have corresponding data on system.
             If so, this indicates a deletion """
 
+        # set membership instead of scanning the dotfiles list per entry
+        dotfile_paths = {dotfile.path for dotfile in dotfiles}
+
         for path in [x.strip() for x in self._list]:
             if not path:
                 continue
@@ -75,10 +78,7 @@ class SyncAlgorithm(LastSyncIndex):
             decrypted_path = (state.core.dotfiles_dir / 'decrypted' / Path(path).relative_to(state.core.dotfiles_dir)).parent / name
 
             # see if status list entry has a corresponding file on disk
-            for dotfile in dotfiles:
-                if decrypted_path == dotfile.path:
-                    break
-            else:
+            if decrypted_path not in dotfile_paths:
                 if decrypted_path.is_file():
                     decrypted_path.unlink()
                     info("check_removed", "deleted_file", decrypted_path)
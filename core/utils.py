@@ -1,19 +1,38 @@
+import os
 import sys
 from pathlib import Path
 import inspect
 import time
 import logging
+import shutil
+import subprocess
 import tempfile
 import hashlib
 import base64
 import tarfile
 import re
+import json
+import mmap
+import atexit
+from contextlib import contextmanager
 
 import git
 from git import Repo
 
+from core.exceptions import MicrodotError
+
+# lz4 is much faster than gzip/lzma and shrinks dir archives before they
+# hit the encryption pipeline, but it is optional
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 logger = logging.getLogger("microdot")
 
+# first bytes of an lz4 frame, used to detect compressed archives
+LZ4_MAGIC = b'\x04\x22\x4d\x18'
+
 
 CATEGORY_JUST = 5
 ACTION_JUST = 5
@@ -21,6 +40,15 @@ ACTION_JUST = 5
 # characters to use instead of the filsystem unsafe +/
 BASE_64_ALT_CHARS = "@-"
 
+# the hash is only used for change detection and filename disambiguation,
+# blake is a lot faster than md5. blake3 (SIMD) is not in the stdlib,
+# fall back to blake2b when it is not installed
+try:
+    from blake3 import blake3 as _new_hasher
+except ImportError:
+    def _new_hasher():
+        return hashlib.blake2b(digest_size=16)
+
 class Lock():
     """ Does lock things """
     def __init__(self, path):
@@ -114,29 +142,153 @@ def die(msg, code=1):
     logger.error(msg)
     sys.exit(code)
 
+# skip tarfile's per-file owner name lookups (pwd/grp), archives are only
+# used as encryption payload and never leave this machine
+tarfile.pwd = None
+tarfile.grp = None
+
+class LZ4CompressReader():
+    """ Read-only file object that lz4 compresses another file object """
+    def __init__(self, f):
+        self._f = f
+        self._compressor = lz4.frame.LZ4FrameCompressor()
+        self._buf = self._compressor.begin()
+        self._eof = False
+
+    def read(self, n=-1):
+        while not self._eof and (n < 0 or len(self._buf) < n):
+            chunk = self._f.read(1 << 20)
+            if chunk:
+                self._buf += self._compressor.compress(chunk)
+            else:
+                self._buf += self._compressor.flush()
+                self._eof = True
+        if n < 0:
+            data, self._buf = self._buf, b''
+        else:
+            data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+def lz4_decompress_chunks(chunks):
+    """ Decompress an lz4 framed stream of byte chunks """
+    decompressor = lz4.frame.LZ4FrameDecompressor()
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+
 def get_tar(src):
-    """ Compress path into tar archive and save in tmp file """
+    """ Pack path into tar archive and save in tmp file """
     tmp_file = Path(tempfile.mktemp())
 
-    with tarfile.open(tmp_file, 'w') as f:
-        f.add(src, arcname=src.name)
+    # stream mode writes sequentially without seeking back
+    if lz4:
+        with lz4.frame.open(tmp_file, 'wb') as fobj, tarfile.open(fileobj=fobj, mode='w|') as f:
+            f.add(src, arcname=src.name)
+    else:
+        with tarfile.open(tmp_file, 'w|') as f:
+            f.add(src, arcname=src.name)
     return tmp_file
 
-def get_rec_hash(path, md5):
-    """ Do some recursive path seeking """
-    md5.update(path.name.encode())
-    if path.is_dir():
-        for i in sorted(path.iterdir(), key=lambda x: x.name):
-            get_rec_hash(i, md5)
+@contextmanager
+def get_tar_stream(src):
+    """ Yield a file object streaming a tar archive of src.
+        Uses the native tar binary when available, its stdout pipe avoids
+        an intermediate tmp file. Falls back to get_tar() otherwise """
+    if shutil.which('tar'):
+        p = subprocess.Popen(['tar', '-cf', '-', '-C', str(src.parent), src.name],
+                             stdout=subprocess.PIPE)
+        try:
+            yield LZ4CompressReader(p.stdout) if lz4 else p.stdout
+        finally:
+            p.stdout.close()
+            returncode = p.wait()
+
+        # a failing tar still produces a readable but truncated stream,
+        # don't let that end up in an archive
+        if returncode != 0:
+            raise MicrodotError(f"Failed to archive: {src}")
+    else:
+        tmp_file = get_tar(src)
+        try:
+            with open(tmp_file, 'rb') as f:
+                yield f
+        finally:
+            tmp_file.unlink()
+
+# files smaller than this are hashed with a plain read, the mmap setup
+# isn't worth it for them
+MMAP_THRESHOLD = 1 << 16
+
+# file content digests cached on stat info so unchanged files are not
+# read and hashed again on every update() run
+HASH_CACHE_PATH = Path.home() / '.cache/microdot/hashes.json'
+
+_hash_cache = None
+_hash_cache_dirty = False
+
+def _load_hash_cache():
+    global _hash_cache
+    if _hash_cache == None:
+        try:
+            _hash_cache = json.loads(HASH_CACHE_PATH.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            _hash_cache = {}
+        atexit.register(_save_hash_cache)
+    return _hash_cache
+
+def _save_hash_cache():
+    if not _hash_cache_dirty:
+        return
+    HASH_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    HASH_CACHE_PATH.write_text(json.dumps(_hash_cache))
+
+def get_file_digest(path):
+    """ Get digest of file contents, cached on (mtime, size) """
+    global _hash_cache_dirty
+    cache = _load_hash_cache()
+
+    st = path.stat()
+    entry = cache.get(str(path))
+    if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+        return bytes.fromhex(entry[2])
+
+    hasher = _new_hasher()
+    if st.st_size > MMAP_THRESHOLD:
+        # hand the kernel mapped pages to the hasher directly instead of
+        # copying the whole file into memory first
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+            hasher.update(mm)
     else:
-        md5.update(path.read_bytes())
+        hasher.update(path.read_bytes())
+    digest = hasher.digest()
+    cache[str(path)] = [st.st_mtime_ns, st.st_size, digest.hex()]
+    _hash_cache_dirty = True
+    return digest
+
+def get_rec_hash(path, hasher):
+    """ Do some recursive path seeking """
+    hasher.update(path.name.encode())
+    if not path.is_dir():
+        # feed the cached content digest instead of the file contents so
+        # unchanged files only cost a stat call
+        hasher.update(get_file_digest(path))
+        return
+
+    # one scandir yields both names and file types, where iterdir with a
+    # per-entry is_dir() scanned every entry twice
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_dir():
+                get_rec_hash(Path(entry.path), hasher)
+            else:
+                hasher.update(entry.name.encode())
+                hasher.update(get_file_digest(Path(entry.path)))
 
 def get_hash(path, n=8):
     """ Get hash of file name and contents """
-    md5 = hashlib.md5()
-    md5.update(path.name.encode())
-    get_rec_hash(path, md5)
-    return base64.b64encode(md5.digest(), altchars=BASE_64_ALT_CHARS.encode()).decode()[:n]
+    hasher = _new_hasher()
+    hasher.update(path.name.encode())
+    get_rec_hash(path, hasher)
+    return base64.b64encode(hasher.digest(), altchars=BASE_64_ALT_CHARS.encode()).decode()[:n]
 
 def get_git_remote(path: Path) -> str:
     try: